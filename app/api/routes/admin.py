@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.api.routes.webhook import webhook_event_stats
+from app.core.profiling import captured_profiles
+from app.core.rate_limit import limiter, rejection_counts, upstream_in_flight
+from app.core.security import get_admin
+from app.schemas.subscription import PlanMigrationRequest
+from app.services.plan_migration import (
+    create_plan_migration,
+    start_plan_migration,
+    get_plan_migration
+)
+
+router = APIRouter(dependencies=[Depends(get_admin)])
+
+
+@router.get("/debug/profiles")
+async def get_profiles():
+    return {"profiles": list(captured_profiles)}
+
+
+@router.get("/debug/webhooks")
+async def get_webhook_stats():
+    return {name: stats.to_dict() for name, stats in webhook_event_stats.items()}
+
+
+@router.get("/debug/rate-limits")
+async def get_rate_limit_stats():
+    return {
+        "rejections": rejection_counts,
+        "trackedBuckets": len(limiter),
+        "upstreamInFlight": upstream_in_flight.count,
+    }
+
+
+@router.post("/migrations", status_code=202)
+async def start_plan_migration_route(request: PlanMigrationRequest):
+    progress = create_plan_migration(
+        request.fromPlan,
+        request.toPlan,
+        request.statuses,
+        request.dryRun,
+        request.jobId
+    )
+    start_plan_migration(progress)
+    return progress.to_dict()
+
+
+@router.get("/migrations/{job_id}")
+async def get_plan_migration_route(job_id: str):
+    progress = get_plan_migration(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    return progress.to_dict()
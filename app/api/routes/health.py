@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from app.core.startup import startup_state
+
+router = APIRouter()
+
+
+@router.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness():
+    if not startup_state.ready:
+        raise HTTPException(status_code=503, detail="Service is warming up")
+
+    return {
+        "status": "ready",
+        "startupSeconds": startup_state.total_seconds,
+        "phases": startup_state.phase_timings,
+    }
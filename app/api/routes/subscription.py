@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from app.core.rate_limit import rate_limit
 from app.core.security import get_current_user
 from app.schemas.subscription import SubscriptionRequest, SubscriptionResponse
 from app.services.subscription import (
     create_subscription,
     get_subscription,
+    get_entitlement,
     update_subscription,
     cancel_subscription
 )
@@ -14,7 +16,7 @@ router = APIRouter()
 @router.post("/subscriptions", response_model=SubscriptionResponse)
 async def create_subscription_route(
     request: SubscriptionRequest,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(rate_limit("create_subscription"))
 ):
     return await create_subscription(current_user, request.planId)
 
@@ -24,14 +26,19 @@ async def get_subscription_route(current_user: str = Depends(get_current_user)):
     return await get_subscription(current_user)
 
 
+@router.get("/subscriptions/entitlement", response_model=dict)
+async def get_entitlement_route(current_user: str = Depends(get_current_user)):
+    return await get_entitlement(current_user)
+
+
 @router.post("/subscriptions/update")
 async def update_subscription_route(
     variant_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(rate_limit("update_subscription"))
 ):
     return await update_subscription(current_user, variant_id)
 
 
 @router.post("/subscriptions/cancel")
-async def cancel_subscription_route(current_user: str = Depends(get_current_user)):
+async def cancel_subscription_route(current_user: str = Depends(rate_limit("cancel_subscription"))):
     return await cancel_subscription(current_user)
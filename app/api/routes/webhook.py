@@ -1,27 +1,117 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.services.webhook import verify_webhook_signature, update_user_subscription
+from app.core.profiling import span
+from app.services.webhook import (
+    verify_webhook_signature,
+    update_user_subscription,
+    update_subscription_status
+)
 from app.db.database import get_db
 import json
 import logging
-from typing import Dict, Any
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-SUPPORTED_EVENTS = ["subscription_created", "subscription_updated"]
+# Handlers return False when the event could not be applied
+WebhookHandler = Callable[[Session, Dict[str, Any]], Awaitable[bool]]
 
+# Mapping of meta.event_name to the handler that processes it
+WEBHOOK_HANDLERS: Dict[str, WebhookHandler] = {}
 
-async def process_webhook_body(request: Request) -> Dict[str, Any]:
+# Matches meta.event_name when it appears before any nested object in meta
+EVENT_NAME_PATTERN = re.compile(
+    rb'"meta"\s*:\s*\{[^{}]*?"event_name"\s*:\s*"([^"\\]+)"')
+
+
+class WebhookEventStats:
+    """
+    Counts and latency of webhook deliveries for one event type.
+    """
+
+    __slots__ = ("processed", "ignored", "failed", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.processed = 0
+        self.ignored = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, outcome: str, duration: float):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = self.processed + self.ignored + self.failed
+        return {
+            "processed": self.processed,
+            "ignored": self.ignored,
+            "failed": self.failed,
+            "avgMs": round(self.total_seconds / count * 1000, 3) if count else 0.0,
+            "maxMs": round(self.max_seconds * 1000, 3),
+        }
+
+
+webhook_event_stats: Dict[str, WebhookEventStats] = {}
+
+
+def record_webhook_event(event_name: str, outcome: str, started_at: float):
+    stats = webhook_event_stats.get(event_name)
+    if stats is None:
+        stats = webhook_event_stats[event_name] = WebhookEventStats()
+    stats.record(outcome, time.perf_counter() - started_at)
+
+
+def webhook_handler(*event_names: str):
+    """
+    Register a coroutine as the handler for one or more webhook event names.
+
+    Args:
+        *event_names (str): The meta.event_name values the handler processes.
+
+    Returns:
+        Callable: A decorator that registers and returns the handler.
+    """
+    def register(handler: WebhookHandler) -> WebhookHandler:
+        for event_name in event_names:
+            WEBHOOK_HANDLERS[event_name] = handler
+        return handler
+
+    return register
+
+
+def peek_event_name(body: bytes) -> Optional[str]:
+    """
+    Read meta.event_name from the raw body without parsing the whole document.
+
+    Args:
+        body (bytes): The raw webhook body.
+
+    Returns:
+        Optional[str]: The event name, or None if it could not be found cheaply.
+    """
+    match = EVENT_NAME_PATTERN.search(body)
+    if not match:
+        return None
+    try:
+        return match.group(1).decode()
+    except UnicodeDecodeError:
+        return None
+
+
+async def process_webhook_body(body: bytes) -> Dict[str, Any]:
     """
     Process the webhook request body.
 
     Args:
-        request (Request): The FastAPI request object.
+        body (bytes): The raw webhook body.
 
     Returns:
         Dict[str, Any]: The parsed JSON body of the webhook.
@@ -30,7 +120,6 @@ async def process_webhook_body(request: Request) -> Dict[str, Any]:
         HTTPException: If the body cannot be decoded or parsed.
     """
     try:
-        body = await request.body()
         body_str = body.decode()
         return json.loads(body_str)
     except UnicodeDecodeError:
@@ -65,18 +154,79 @@ async def extract_subscription_data(event: Dict[str, Any]) -> Dict[str, Any]:
             "renews_at": event["data"]["attributes"]["renews_at"]
         }
     except KeyError as e:
-        logger.error(f"Missing required field in webhook data: {str(e)}")
+        logger.error("Missing required field in webhook data: %s", e)
         raise HTTPException(
             status_code=400, detail=f"Missing required field: {str(e)}")
 
 
+@webhook_handler("subscription_created", "subscription_updated")
+async def handle_subscription_change(db: Session, event: Dict[str, Any]) -> bool:
+    subscription_data = await extract_subscription_data(event)
+
+    with span("db.update_subscription"):
+        subscription = await update_user_subscription(
+            db,
+            subscription_data["user_id"],
+            subscription_data["customer_id"],
+            subscription_data["subscription_id"],
+            subscription_data["plan"],
+            subscription_data["status"],
+            subscription_data["renews_at"]
+        )
+    return subscription is not None
+
+
+@webhook_handler(
+    "subscription_cancelled",
+    "subscription_expired",
+    "subscription_resumed",
+    "subscription_paused",
+    "subscription_unpaused"
+)
+async def handle_subscription_status_change(db: Session, event: Dict[str, Any]) -> bool:
+    with span("db.update_subscription_status"):
+        subscription = await update_subscription_status(
+            db,
+            str(event["data"]["id"]),
+            event["data"]["attributes"]["status"]
+        )
+    return subscription is not None
+
+
+@webhook_handler("subscription_payment_success", "subscription_payment_recovered")
+async def handle_payment_success(db: Session, event: Dict[str, Any]) -> bool:
+    with span("db.update_subscription_status"):
+        subscription = await update_subscription_status(
+            db,
+            str(event["data"]["attributes"]["subscription_id"]),
+            "active",
+            only_if=("past_due", "unpaid")
+        )
+    return subscription is not None
+
+
+@webhook_handler("subscription_payment_failed")
+async def handle_payment_failed(db: Session, event: Dict[str, Any]) -> bool:
+    with span("db.update_subscription_status"):
+        subscription = await update_subscription_status(
+            db,
+            str(event["data"]["attributes"]["subscription_id"]),
+            "past_due",
+            only_if=("active",)
+        )
+    return subscription is not None
+
+
 @router.post("/webhook")
 async def handle_webhook(request: Request, db: Session = Depends(get_db)):
     """
     Handle incoming webhooks from Lemon Squeezy.
 
-    This endpoint verifies the webhook signature, processes supported events,
-    and updates user subscriptions accordingly.
+    This endpoint verifies the webhook signature over the raw body, skips events
+    without a registered handler before parsing them, and dispatches the rest
+    to their handler in WEBHOOK_HANDLERS. Events whose handler could not apply
+    them, for example because the subscription is unknown or the database
+    update failed, are counted as failed and answered with a 500.
 
     Args:
         request (Request): The FastAPI request object.
@@ -93,35 +243,48 @@ async def handle_webhook(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=400, detail="Missing X-Signature header")
 
+    started_at = time.perf_counter()
+    event_name = None
     try:
-        event = await process_webhook_body(request)
+        body = await request.body()
 
-        if not await verify_webhook_signature(signature, json.dumps(event), settings.LEMON_SQUEEZY_WEBHOOK_SECRET):
-            raise HTTPException(status_code=400, detail="Invalid signature")
+        with span("webhook.verify"):
+            if not await verify_webhook_signature(signature, body, settings.LEMON_SQUEEZY_WEBHOOK_SECRET):
+                raise HTTPException(status_code=400, detail="Invalid signature")
 
-        event_name = event["meta"]["event_name"]
-        if event_name not in SUPPORTED_EVENTS:
-            logger.info(f"Ignoring unsupported event: {event_name}")
+        event_name = peek_event_name(body)
+        if event_name is not None and event_name not in WEBHOOK_HANDLERS:
+            record_webhook_event(event_name, "ignored", started_at)
+            logger.info("Ignoring unsupported event: %s", event_name, extra={"sample": True})
             return {"message": "Webhook ignored (unsupported event)"}
 
-        subscription_data = await extract_subscription_data(event)
+        with span("webhook.parse"):
+            event = await process_webhook_body(body)
 
-        await update_user_subscription(
-            db,
-            subscription_data["user_id"],
-            subscription_data["customer_id"],
-            subscription_data["subscription_id"],
-            subscription_data["plan"],
-            subscription_data["status"],
-            subscription_data["renews_at"]
-        )
+        event_name = event["meta"]["event_name"]
+        handler = WEBHOOK_HANDLERS.get(event_name)
+        if handler is None:
+            record_webhook_event(event_name, "ignored", started_at)
+            logger.info("Ignoring unsupported event: %s", event_name, extra={"sample": True})
+            return {"message": "Webhook ignored (unsupported event)"}
 
-        logger.info(
-            f"Successfully processed {event_name} event for user {subscription_data['user_id']}")
+        if not await handler(db, event):
+            # Lemon Squeezy redelivers events that did not get a 2xx response
+            raise HTTPException(status_code=500, detail="Failed to apply webhook")
+
+        record_webhook_event(event_name, "processed", started_at)
+        logger.info("Successfully processed %s event", event_name, extra={"sample": True})
         return {"message": "Webhook processed successfully"}
 
     except HTTPException:
+        record_webhook_event(event_name or "unknown", "failed", started_at)
         raise
+    except KeyError as e:
+        record_webhook_event(event_name or "unknown", "failed", started_at)
+        logger.error("Missing required field in webhook data: %s", e)
+        raise HTTPException(
+            status_code=400, detail=f"Missing required field: {str(e)}")
     except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
+        record_webhook_event(event_name or "unknown", "failed", started_at)
+        logger.error("Error processing webhook: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -6,8 +6,33 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: list = ["*"]
     DATABASE_URL: str = "sqlite:///./subscriptions.db"
     LEMON_SQUEEZY_API_KEY: str
+    LEMON_SQUEEZY_WEBHOOK_SECRET: str
+    LEMON_SQUEEZY_API_URL: str = "https://api.lemonsqueezy.com/v1"
     FIREBASE_PROJECT_ID: str
     STORE_ID: str = "113406"
+    RATE_LIMIT_CAPACITY: float = 5
+    RATE_LIMIT_REFILL_PER_SECOND: float = 0.5
+    RATE_LIMIT_MAX_BUCKETS: int = 10000
+    UPSTREAM_MAX_IN_FLIGHT: int = 50
+    LOAD_SHED_RETRY_AFTER: float = 1
+    LOG_LEVEL: str = "INFO"
+    LOG_INFO_SAMPLE_RATE: float = 1.0
+    ADMIN_TOKEN: str = ""
+    PROFILE_TOKEN: str = ""
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_SLOW_THRESHOLD_MS: float = 0.0
+    PROFILE_BUFFER_SIZE: int = 50
+    ENTITLEMENT_SNAPSHOT_PATH: str = "./entitlements.snapshot"
+    ENTITLEMENT_SNAPSHOT_CAPACITY: int = 100000
+    ENTITLEMENT_SNAPSHOT_REFRESH_SECONDS: float = 2.0
+    ENTITLEMENT_SNAPSHOT_MAX_AGE_SECONDS: float = 15.0
+    ENTITLEMENT_SNAPSHOT_LOOKBACK_SECONDS: float = 60.0
+    ENTITLEMENT_SNAPSHOT_RECONCILE_SECONDS: float = 300.0
+    MIGRATION_CHECKPOINT_DIR: str = "./migrations"
+    MIGRATION_CONCURRENCY: int = 5
+    MIGRATION_REQUESTS_PER_SECOND: float = 2.0
+    MIGRATION_BATCH_SIZE: int = 100
+    MIGRATION_MAX_ATTEMPTS: int = 3
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,157 @@
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+
+# Request ID of the request being handled on the current task, if any
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Longer client-supplied request IDs are replaced rather than logged
+MAX_REQUEST_ID_LENGTH = 128
+
+# Loggers uvicorn configures with handlers of its own
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: Optional[QueueListener] = None
+_saved_handlers: List[Tuple[logging.Logger, List[logging.Handler], bool]] = []
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Render log records as single-line JSON objects.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drop a fraction of records logged with `extra={"sample": True}`.
+
+    Only records at INFO or below are sampled; warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not getattr(record, "sample", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Queue records for the listener thread without formatting them on the event loop.
+
+    The request ID is captured here because context variables are not visible
+    from the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        return record
+
+
+class RequestIdMiddleware:
+    """
+    Tag each request with an ID for its log records and echo it as X-Request-ID.
+
+    The client's X-Request-ID is kept when present and at most
+    MAX_REQUEST_ID_LENGTH characters long; otherwise a new one is generated.
+    Written as plain ASGI so it adds no task or queue to the request path.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("X-Request-ID")
+        if not request_id or len(request_id) > MAX_REQUEST_ID_LENGTH:
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
+
+
+def setup_logging():
+    """
+    Route all logging through a queue so handler I/O runs on a background thread.
+
+    Uvicorn's own loggers are routed through the same queue, so every line is
+    written once, as JSON. Undone by shutdown_logging.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_INFO_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    _saved_handlers.append((root, root.handlers, root.propagate))
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        _saved_handlers.append((uvicorn_logger, uvicorn_logger.handlers, uvicorn_logger.propagate))
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Flush queued records, stop the listener thread and restore the previous handlers.
+    """
+    global _listener
+    if _listener is None:
+        return
+
+    for saved_logger, handlers, propagate in _saved_handlers:
+        saved_logger.handlers = handlers
+        saved_logger.propagate = propagate
+    _saved_handlers.clear()
+
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,145 @@
+import hmac
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+
+# Span currently open on this task; None means the request is not being profiled
+_current_span: ContextVar[Optional["Span"]] = ContextVar("profile_span", default=None)
+
+_NULL_SPAN = nullcontext()
+
+# Span trees of the most recent slow or explicitly profiled requests
+captured_profiles: Deque[Dict[str, Any]] = deque(maxlen=settings.PROFILE_BUFFER_SIZE)
+
+
+class Span:
+    """
+    A timed section of a request, with nested child spans.
+    """
+
+    __slots__ = ("name", "start", "duration", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration: float = 0.0
+        self.children: List["Span"] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "durationMs": round(self.duration * 1000, 3),
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, parent: Span, name: str):
+        self.span = Span(name)
+        parent.children.append(self.span)
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self.span.start
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name: str):
+    """
+    Time a section of the current request if it is being profiled.
+
+    When profiling is off this is a single context variable lookup.
+
+    Args:
+        name (str): The name shown for the section in the span tree.
+
+    Returns:
+        ContextManager: A context manager covering the section.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NULL_SPAN
+    return _SpanContext(parent, name)
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILE_TOKEN or settings.PROFILE_SAMPLE_RATE > 0
+                or settings.PROFILE_SLOW_THRESHOLD_MS > 0)
+
+
+class ProfilingMiddleware:
+    """
+    Collect a span tree for requests that are explicitly profiled, sampled, or
+    checked against the slow-request threshold.
+
+    Written as plain ASGI so that, with profiling switched off, requests pass
+    straight through. Explicitly profiled requests get their breakdown in a
+    Server-Timing header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.enabled = profiling_enabled()
+
+    def _explicitly_requested(self, scope: Scope) -> bool:
+        if not settings.PROFILE_TOKEN:
+            return False
+        token = Headers(scope=scope).get("X-Profile-Token")
+        return bool(token and hmac.compare_digest(token, settings.PROFILE_TOKEN))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = self._explicitly_requested(scope)
+        sampled = settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (requested or sampled or settings.PROFILE_SLOW_THRESHOLD_MS > 0):
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(f"{scope['method']} {scope['path']}")
+        response_start: Dict[str, Any] = {}
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                response_start["status"] = message["status"]
+                response_start["request_id"] = headers.get("X-Request-ID")
+                if requested:
+                    timings = [f'{child.name.replace(" ", "_")};dur={child.duration * 1000:.3f}'
+                               for child in root.children]
+                    elapsed_ms = (time.perf_counter() - root.start) * 1000
+                    timings.append(f"total;dur={elapsed_ms:.3f}")
+                    headers.append("Server-Timing", ", ".join(timings))
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            root.duration = time.perf_counter() - root.start
+            _current_span.reset(token)
+
+            slow = 0 < settings.PROFILE_SLOW_THRESHOLD_MS <= root.duration * 1000
+            if requested or sampled or slow:
+                captured_profiles.append({
+                    "requestId": response_start.get("request_id"),
+                    "status": response_start.get("status"),
+                    "reason": "requested" if requested else "sampled" if sampled else "slow",
+                    "capturedAt": time.time(),
+                    "trace": root.to_dict(),
+                })
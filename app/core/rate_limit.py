@@ -0,0 +1,150 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, status
+from app.core.config import settings
+from app.core.security import get_current_user
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at a fixed rate.
+    """
+
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated_at = now
+
+    def consume(self, capacity: float, refill_rate: float, now: float) -> float:
+        """
+        Try to take one token from the bucket.
+
+        Args:
+            capacity (float): The maximum number of tokens the bucket holds.
+            refill_rate (float): Tokens added per second.
+            now (float): The current monotonic time.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        elapsed = now - self.updated_at
+        self.tokens = min(capacity, self.tokens + elapsed * refill_rate)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / refill_rate
+
+
+class RateLimiter:
+    """
+    In-process token-bucket limiter keyed by (user_id, route).
+
+    The bucket table is an LRU capped at `max_buckets` entries so memory stays
+    bounded no matter how many distinct users hit the API.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, max_buckets: int):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+
+    def check(self, user_id: str, route: str) -> float:
+        """
+        Consume a token for the given user and route.
+
+        Args:
+            user_id (str): The ID of the user.
+            route (str): The name of the route being called.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds to wait.
+        """
+        now = time.monotonic()
+        key = (user_id, route)
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        return bucket.consume(self.capacity, self.refill_rate, now)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class InFlightCounter:
+    """
+    Tracks the number of upstream calls currently in progress.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        self.count += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.count -= 1
+        return False
+
+
+limiter = RateLimiter(
+    capacity=settings.RATE_LIMIT_CAPACITY,
+    refill_rate=settings.RATE_LIMIT_REFILL_PER_SECOND,
+    max_buckets=settings.RATE_LIMIT_MAX_BUCKETS,
+)
+upstream_in_flight = InFlightCounter()
+
+# Rejections per route, split by reason ("rate_limited" / "shed")
+rejection_counts: Dict[str, Dict[str, int]] = {}
+
+
+def _reject(route: str, reason: str, status_code: int, retry_after: float, detail: str):
+    counts = rejection_counts.setdefault(route, {"rate_limited": 0, "shed": 0})
+    counts[reason] += 1
+    raise HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(route: str):
+    """
+    Build a dependency that applies admission control to a mutation route.
+
+    Requests are shed with 503 when too many upstream calls are in flight, and
+    limited with 429 when the user's token bucket for the route is empty.
+
+    Args:
+        route (str): The name used to key buckets and rejection counts.
+
+    Returns:
+        Callable: A FastAPI dependency returning the current user's ID.
+    """
+    async def dependency(current_user: str = Depends(get_current_user)) -> str:
+        if upstream_in_flight.count >= settings.UPSTREAM_MAX_IN_FLIGHT:
+            _reject(route, "shed", status.HTTP_503_SERVICE_UNAVAILABLE,
+                    settings.LOAD_SHED_RETRY_AFTER, "Service overloaded, try again later")
+
+        retry_after = limiter.check(current_user, route)
+        if retry_after > 0:
+            _reject(route, "rate_limited", status.HTTP_429_TOO_MANY_REQUESTS,
+                    retry_after, "Too many requests")
+
+        return current_user
+
+    return dependency
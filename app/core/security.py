@@ -1,4 +1,5 @@
-from fastapi import Depends, HTTPException, status
+import hmac
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.config import settings
 
@@ -19,3 +20,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     return user_id
+
+
+async def get_admin(x_admin_token: str = Header(None)) -> None:
+    if not (settings.ADMIN_TOKEN and x_admin_token
+            and hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
@@ -0,0 +1,44 @@
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """
+    Tracks application warm-up so readiness only flips once every phase has run.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.phase_timings: Dict[str, float] = {}
+        self.started_at = time.perf_counter()
+        self.total_seconds: float = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a named startup phase.
+
+        Args:
+            name (str): The name of the phase, used as the key in phase_timings.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_timings[name] = time.perf_counter() - start
+            logger.info("Startup phase %s took %.1fms", name, self.phase_timings[name] * 1000)
+
+    def mark_ready(self):
+        self.total_seconds = time.perf_counter() - self.started_at
+        self.ready = True
+        logger.info("Startup complete in %.1fms", self.total_seconds * 1000)
+
+    def mark_not_ready(self):
+        self.ready = False
+
+
+startup_state = StartupState()
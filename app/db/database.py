@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -14,6 +14,15 @@ async def init_db():
     Base.metadata.create_all(bind=engine)
 
 
+async def warm_db_pool():
+    """
+    Open a pooled connection and run a trivial query so the first request
+    does not pay for connecting to the database.
+    """
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,11 +1,46 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.orm import configure_mappers
+from app.api.routes import admin
+from app.api.routes import health
 from app.api.routes import subscription
 from app.api.routes import webhook
 from app.core.config import settings
-from app.db.database import init_db
+from app.core.logging_config import RequestIdMiddleware, setup_logging, shutdown_logging
+from app.core.profiling import ProfilingMiddleware, profiling_enabled
+from app.core.startup import startup_state
+from app.db.database import init_db, warm_db_pool
+from app.services.entitlements import start_entitlement_snapshot, stop_entitlement_snapshot
+from app.services.lemon_squeezy import open_lemon_squeezy_client, close_lemon_squeezy_client
+from app.services.plan_migration import stop_plan_migrations
+
+
+# Starlette 0.14 accepts a lifespan as a plain async generator function
+async def lifespan(app: FastAPI):
+    setup_logging()
+    with startup_state.phase("init_db"):
+        await init_db()
+    with startup_state.phase("warm_db_pool"):
+        await warm_db_pool()
+    with startup_state.phase("configure_mappers"):
+        configure_mappers()
+    with startup_state.phase("open_lemon_squeezy_client"):
+        await open_lemon_squeezy_client()
+    with startup_state.phase("entitlement_snapshot"):
+        await start_entitlement_snapshot()
+    startup_state.mark_ready()
+
+    yield
+
+    startup_state.mark_not_ready()
+    await stop_plan_migrations()
+    await stop_entitlement_snapshot()
+    await close_lemon_squeezy_client()
+    shutdown_logging()
+
 
 app = FastAPI(title=settings.PROJECT_NAME)
+app.router.lifespan_context = lifespan
 
 # Add CORS middleware
 app.add_middleware(
@@ -16,11 +51,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestIdMiddleware)
+
+# Registered after the request ID middleware so it wraps it and sees X-Request-ID.
+# Not registered at all when every profiling setting is off.
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+
 # Include routers
+app.include_router(health.router)
 app.include_router(subscription.router, prefix="/api/v1")
 app.include_router(webhook.router, prefix="/api/v1")
-
-
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
+app.include_router(admin.router, prefix="/api/v1/admin")
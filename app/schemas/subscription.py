@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -13,6 +13,14 @@ class SubscriptionResponse(BaseModel):
     redirectUrl: Optional[str] = None
 
 
+class PlanMigrationRequest(BaseModel):
+    fromPlan: str
+    toPlan: str
+    statuses: List[str] = ["active"]
+    dryRun: bool = False
+    jobId: Optional[str] = None
+
+
 class SubscriptionDetails(BaseModel):
     plan: str
     status: str
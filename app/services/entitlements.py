@@ -0,0 +1,451 @@
+import asyncio
+import bisect
+import calendar
+import fcntl
+import mmap
+import os
+import struct
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+# Snapshot file layout:
+#   header (64 bytes): magic, record size, capacity, sequence, count of slot 0,
+#                      count of slot 1, time of the writer's last refresh
+#   slot 0, slot 1:     `capacity` fixed-width records each, sorted by user_id
+# The slot being read is `sequence % 2`. The writer fills the other slot and
+# then bumps the sequence, so readers never see a half-written slot unless the
+# sequence moved underneath them, in which case they retry. Readers refuse a
+# snapshot whose writer has not refreshed it within the configured max age.
+MAGIC = b"ENTSNAP2"
+RETIRED = b"RETIRED!"
+HEADER = struct.Struct("<8sIIQQQd")
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = 16
+COUNTS_OFFSET = 24
+REFRESHED_AT_OFFSET = 40
+RECORD = struct.Struct("<32s16s16sIq")
+USER_ID_SIZE = 32
+MAX_READ_ATTEMPTS = 5
+
+
+class Entitlement(NamedTuple):
+    plan: str
+    status: str
+    monthly_character_limit: int
+    renews_at: Optional[datetime]
+
+
+def _slot_offset(slot: int, capacity: int) -> int:
+    return HEADER_SIZE + slot * capacity * RECORD.size
+
+
+def _file_size(capacity: int) -> int:
+    return _slot_offset(2, capacity)
+
+
+def _to_timestamp(value: Optional[datetime]) -> int:
+    if not isinstance(value, datetime):
+        return 0
+    return calendar.timegm(value.utctimetuple())
+
+
+def _pack_record(user_id: bytes, entitlement: Entitlement) -> bytes:
+    return RECORD.pack(
+        user_id,
+        entitlement.plan.encode()[:16],
+        entitlement.status.encode()[:16],
+        entitlement.monthly_character_limit or 0,
+        _to_timestamp(entitlement.renews_at),
+    )
+
+
+class EntitlementSnapshotReader:
+    """
+    Lock-free reader over the memory-mapped entitlement snapshot.
+
+    Every worker maps the same file, so the data lives once in the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._capacity = 0
+
+    def _open(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        magic, record_size, capacity = HEADER.unpack_from(mapped, 0)[:3]
+        if magic != MAGIC or record_size != RECORD.size or len(mapped) < _file_size(capacity):
+            mapped.close()
+            return False
+
+        if self._map is not None:
+            self._map.close()
+        self._map = mapped
+        self._capacity = capacity
+        return True
+
+    def get(self, user_id: str) -> Optional[Entitlement]:
+        """
+        Look up a user's entitlement.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            Optional[Entitlement]: The entitlement, or None if the user is not in the snapshot.
+
+        Raises:
+            LookupError: If the snapshot is unavailable, stale, cannot hold this
+                user, or could not be read consistently.
+        """
+        if self._map is None and not self._open():
+            raise LookupError("Entitlement snapshot is not available")
+
+        key = user_id.encode().ljust(USER_ID_SIZE, b"\0")
+        if len(key) > USER_ID_SIZE:
+            # The writer cannot store this user, so absence here means nothing
+            raise LookupError("User ID is too long for the entitlement snapshot")
+
+        for _ in range(MAX_READ_ATTEMPTS):
+            if self._map[:len(MAGIC)] != MAGIC and not self._open():
+                raise LookupError("Entitlement snapshot is not available")
+
+            mapped = self._map
+            refreshed_at = struct.unpack_from("<d", mapped, REFRESHED_AT_OFFSET)[0]
+            if time.time() - refreshed_at > settings.ENTITLEMENT_SNAPSHOT_MAX_AGE_SECONDS:
+                raise LookupError("Entitlement snapshot is stale")
+
+            sequence = struct.unpack_from("<Q", mapped, SEQUENCE_OFFSET)[0]
+            slot = sequence % 2
+            count = struct.unpack_from("<Q", mapped, COUNTS_OFFSET + slot * 8)[0]
+            capacity = self._capacity
+
+            base = _slot_offset(slot, capacity)
+            low, high = 0, count
+            found = None
+            while low < high:
+                middle = (low + high) // 2
+                offset = base + middle * RECORD.size
+                probe = mapped[offset:offset + USER_ID_SIZE]
+                if probe < key:
+                    low = middle + 1
+                elif probe > key:
+                    high = middle
+                else:
+                    found = RECORD.unpack_from(mapped, offset)
+                    break
+
+            if struct.unpack_from("<Q", mapped, SEQUENCE_OFFSET)[0] != sequence:
+                continue
+
+            if found is None:
+                return None
+            _, plan, status, limit, renews_at = found
+            return Entitlement(
+                plan=plan.rstrip(b"\0").decode(),
+                status=status.rstrip(b"\0").decode(),
+                monthly_character_limit=limit,
+                renews_at=datetime.utcfromtimestamp(renews_at) if renews_at else None,
+            )
+
+        raise LookupError("Entitlement snapshot changed during every read attempt")
+
+
+class EntitlementSnapshotWriter:
+    """
+    Maintains the entitlement snapshot from changes to the subscriptions table.
+
+    Only one process may write; call `try_acquire` to find out whether this is it.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._lock_file = None
+        self._map: Optional[mmap.mmap] = None
+        # Packed record for every user, reused whenever the slot is laid out again
+        self._records: Dict[bytes, bytes] = {}
+        # Keys in the order of the last published slot; None when it must be re-sorted
+        self._keys: Optional[List[bytes]] = None
+        # Keys added, and existing keys whose record changed, since the last publish
+        self._added: Set[bytes] = set()
+        self._dirty: Set[bytes] = set()
+        self._watermark: Optional[datetime] = None
+        self._reconciled_at = 0.0
+
+    def try_acquire(self) -> bool:
+        """
+        Take the writer lock without blocking and map the snapshot file.
+
+        Returns:
+            bool: True if this process is now the writer.
+        """
+        # The live slot may have been written by another process
+        self._keys = None
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+
+        size = _file_size(self.capacity)
+        try:
+            if not self._reuse_existing(size):
+                self._create(size)
+        except OSError:
+            self.release()
+            raise
+        return True
+
+    @property
+    def acquired(self) -> bool:
+        return self._map is not None
+
+    def _reuse_existing(self, size: int) -> bool:
+        # Keep the current file, and its sequence number, when the layout matches
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            if os.fstat(fd).st_size != size:
+                self._retire(fd)
+                return False
+            mapped = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        magic, record_size, capacity = HEADER.unpack_from(mapped, 0)[:3]
+        if (magic, record_size, capacity) != (MAGIC, RECORD.size, self.capacity):
+            mapped.close()
+            return False
+        self._map = mapped
+        return True
+
+    @staticmethod
+    def _retire(fd: int):
+        # Tell readers still mapping the old file to reopen the path
+        if os.fstat(fd).st_size >= len(MAGIC):
+            os.pwrite(fd, RETIRED, 0)
+
+    def _create(self, size: int):
+        # Build the new file aside and swap it in, so readers never map a file
+        # that is shorter than they expect
+        temp_path = f"{self.path}.tmp"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._map[:HEADER.size] = HEADER.pack(MAGIC, RECORD.size, self.capacity, 0, 0, 0, 0.0)
+        os.replace(temp_path, self.path)
+
+    def release(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _load_changes(self, full: bool) -> int:
+        # Taken before querying, so anything committed while the query runs is
+        # re-read next time
+        started_at = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            query = db.query(
+                Subscription.user_id,
+                Subscription.plan,
+                Subscription.subscription_status,
+                Subscription.monthly_character_limit,
+                Subscription.renews_at,
+            )
+            if not full:
+                # Re-read a window before the last refresh, so a row committed
+                # after a later-stamped one is not missed
+                lookback = timedelta(seconds=settings.ENTITLEMENT_SNAPSHOT_LOOKBACK_SECONDS)
+                query = query.filter(Subscription.updated_at >= self._watermark - lookback)
+
+            changed = 0
+            seen = set()
+            for row in query:
+                key = row.user_id.encode()
+                if len(key) > USER_ID_SIZE:
+                    logger.warning("User ID too long for entitlement snapshot: %s", row.user_id)
+                    continue
+
+                key = key.ljust(USER_ID_SIZE, b"\0")
+                seen.add(key)
+                record = _pack_record(key, Entitlement(
+                    plan=row.plan or "",
+                    status=row.subscription_status or "",
+                    monthly_character_limit=row.monthly_character_limit or 0,
+                    renews_at=row.renews_at,
+                ))
+                # Rows inside the lookback window match again on every refresh;
+                # only count real changes
+                previous = self._records.get(key)
+                if previous != record:
+                    if previous is None:
+                        self._added.add(key)
+                    else:
+                        self._dirty.add(key)
+                    self._records[key] = record
+                    changed += 1
+
+            if full:
+                # A full scan also drops users whose rows were deleted
+                removed = self._records.keys() - seen
+                for key in removed:
+                    del self._records[key]
+                if removed:
+                    self._keys = None
+                    changed += len(removed)
+                self._reconciled_at = time.monotonic()
+            self._watermark = started_at
+            return changed
+        finally:
+            db.close()
+
+    def _publish(self) -> bool:
+        count = len(self._records)
+        if count > self.capacity:
+            logger.error(
+                "Entitlement snapshot capacity %d exceeded by %d subscriptions; keeping previous snapshot",
+                self.capacity, count)
+            return False
+
+        sequence = struct.unpack_from("<Q", self._map, SEQUENCE_OFFSET)[0]
+        live = _slot_offset(sequence % 2, self.capacity)
+        target = _slot_offset((sequence + 1) % 2, self.capacity)
+
+        if self._keys is None:
+            # First publish, or users were removed: lay the slot out again from
+            # the cached records
+            self._keys = sorted(self._records)
+            records = b"".join([self._records[key] for key in self._keys])
+            self._map[target:target + len(records)] = records
+        else:
+            # Copy the live slot, making room for added users as we go, then
+            # patch the records that changed
+            added = sorted(self._added)
+            copied = 0
+            write = target
+            for key in added:
+                index = bisect.bisect_left(self._keys, key)
+                size = (index - copied) * RECORD.size
+                self._map.move(write, live + copied * RECORD.size, size)
+                write += size
+                self._map[write:write + RECORD.size] = self._records[key]
+                write += RECORD.size
+                copied = index
+            self._map.move(write, live + copied * RECORD.size, (len(self._keys) - copied) * RECORD.size)
+            if added:
+                # Appending to a sorted list sorts in close to linear time
+                self._keys.extend(added)
+                self._keys.sort()
+
+            for key in self._dirty:
+                offset = target + bisect.bisect_left(self._keys, key) * RECORD.size
+                self._map[offset:offset + RECORD.size] = self._records[key]
+        self._added.clear()
+        self._dirty.clear()
+
+        struct.pack_into("<Q", self._map, COUNTS_OFFSET + ((sequence + 1) % 2) * 8, count)
+        struct.pack_into("<Q", self._map, SEQUENCE_OFFSET, sequence + 1)
+        return True
+
+    def refresh(self) -> int:
+        """
+        Apply subscription changes since the last refresh and publish a new snapshot.
+
+        Changes are found by their UTC updated_at, re-reading a lookback window
+        to cover rows that commit out of order. Every so often the whole table
+        is read instead, which also catches rows whose updated_at was not set.
+        The refresh time in the header is updated whenever the snapshot is known
+        to match the database, so readers can tell a live writer from a dead one.
+
+        Returns:
+            int: The number of entries whose value changed.
+        """
+        first_load = self._watermark is None
+        reconcile_due = time.monotonic() - self._reconciled_at >= settings.ENTITLEMENT_SNAPSHOT_RECONCILE_SECONDS
+        changed = self._load_changes(first_load or reconcile_due)
+        if (changed or first_load) and not self._publish():
+            return changed
+        struct.pack_into("<d", self._map, REFRESHED_AT_OFFSET, time.time())
+        return changed
+
+
+entitlement_snapshot = EntitlementSnapshotReader(settings.ENTITLEMENT_SNAPSHOT_PATH)
+
+_writer: Optional[EntitlementSnapshotWriter] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+async def _run_snapshot(writer: EntitlementSnapshotWriter):
+    # Workers that are not the writer keep trying for the lock, so one of them
+    # takes over if the writer process exits
+    while True:
+        await asyncio.sleep(settings.ENTITLEMENT_SNAPSHOT_REFRESH_SECONDS)
+        try:
+            if writer.acquired or await run_in_threadpool(writer.try_acquire):
+                await run_in_threadpool(writer.refresh)
+        except Exception as e:
+            logger.error("Error refreshing entitlement snapshot: %s", e)
+
+
+async def start_entitlement_snapshot() -> Tuple[bool, int]:
+    """
+    Become the snapshot writer if no other worker is, and build the first snapshot.
+
+    Either way, a background task keeps the snapshot fresh, or keeps trying to
+    take over as writer.
+
+    Returns:
+        Tuple[bool, int]: Whether this process is the writer, and the rows loaded.
+    """
+    global _writer, _writer_task
+    writer = EntitlementSnapshotWriter(settings.ENTITLEMENT_SNAPSHOT_PATH, settings.ENTITLEMENT_SNAPSHOT_CAPACITY)
+    loaded = 0
+    try:
+        if writer.try_acquire():
+            loaded = await run_in_threadpool(writer.refresh)
+    except OSError as e:
+        logger.error("Could not open entitlement snapshot for writing: %s", e)
+
+    _writer = writer
+    _writer_task = asyncio.create_task(_run_snapshot(writer))
+    return writer.acquired, loaded
+
+
+async def stop_entitlement_snapshot():
+    global _writer, _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except asyncio.CancelledError:
+            pass
+        _writer_task = None
+    if _writer is not None:
+        _writer.release()
+        _writer = None
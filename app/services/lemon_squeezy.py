@@ -1,11 +1,11 @@
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from app.core.config import settings
+from app.core.profiling import span
+from app.core.rate_limit import upstream_in_flight
 import logging
 from fastapi import HTTPException
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Mapping of plan names to their corresponding variant IDs
@@ -15,7 +15,10 @@ PRODUCT_VARIANT_ID_MAP = {
 }
 
 # Base URL for Lemon Squeezy API
-LEMON_SQUEEZY_BASE_URL = "https://api.lemonsqueezy.com/v1"
+LEMON_SQUEEZY_BASE_URL = settings.LEMON_SQUEEZY_API_URL
+
+# Shared client so connections to the API are reused across requests
+_client: Optional[httpx.AsyncClient] = None
 
 # Common headers for Lemon Squeezy API requests
 
@@ -28,6 +31,31 @@ def get_lemon_squeezy_headers() -> Dict[str, str]:
     }
 
 
+def get_lemon_squeezy_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient()
+    return _client
+
+
+async def open_lemon_squeezy_client():
+    """
+    Create the shared client and open a connection to the API ahead of the first request.
+    """
+    client = get_lemon_squeezy_client()
+    try:
+        await client.head(LEMON_SQUEEZY_BASE_URL, headers=get_lemon_squeezy_headers())
+    except httpx.HTTPError as e:
+        logger.warning("Could not pre-open Lemon Squeezy connection: %s", e)
+
+
+async def close_lemon_squeezy_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def make_lemon_squeezy_request(method: str, endpoint: str, json_data: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     Make a request to the Lemon Squeezy API.
@@ -47,17 +75,20 @@ async def make_lemon_squeezy_request(method: str, endpoint: str, json_data: Dict
     headers = get_lemon_squeezy_headers()
 
     try:
-        async with httpx.AsyncClient() as client:
+        with upstream_in_flight, span(f"lemon_squeezy.{method.lower()}"):
+            client = get_lemon_squeezy_client()
             response = await client.request(method, url, headers=headers, json=json_data)
             response.raise_for_status()
             return response.json()
     except httpx.HTTPStatusError as e:
-        logger.error(f"Lemon Squeezy API error: {e.response.text}")
+        logger.error("Lemon Squeezy API error: %s", e.response.text)
+        retry_after = e.response.headers.get("Retry-After")
         raise HTTPException(status_code=e.response.status_code,
-                            detail="Lemon Squeezy API error")
+                            detail="Lemon Squeezy API error",
+                            headers={"Retry-After": retry_after} if retry_after else None)
     except Exception as e:
         logger.error(
-            f"Unexpected error in Lemon Squeezy API request: {str(e)}")
+            "Unexpected error in Lemon Squeezy API request: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -0,0 +1,448 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.subscription import Subscription
+from app.services.lemon_squeezy import PRODUCT_VARIANT_ID_MAP, update_lemon_squeezy_subscription
+from app.services.webhook import SUBSCRIPTION_PLANS
+
+logger = logging.getLogger(__name__)
+
+# Job IDs become file names, so keep them to a safe alphabet
+JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Provider statuses worth retrying after a pause
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RequestPacer:
+    """
+    Spaces provider calls evenly at a target rate and absorbs rate-limit back-off.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        start = max(now, self._next_slot)
+        self._next_slot = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds: float):
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class MigrationProgress:
+    """
+    Progress of a plan migration job, persisted as its checkpoint file.
+
+    The checkpoint is the source of truth, so any worker can report on a job
+    that another worker is running.
+    """
+
+    def __init__(self, job_id: str, from_plan: str, to_plan: str, statuses: List[str], dry_run: bool):
+        self.job_id = job_id
+        self.from_plan = from_plan
+        self.to_plan = to_plan
+        self.statuses = statuses
+        self.dry_run = dry_run
+        self.state = "pending"
+        self.total = 0
+        self.migrated = 0
+        self.failed: List[str] = []
+        self.cursor: Optional[str] = None
+        # Provider calls settled by the current run, for throughput
+        self.attempted = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock_file = None
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Dict[str, Any]) -> "MigrationProgress":
+        progress = cls(checkpoint["job_id"], checkpoint["from_plan"], checkpoint["to_plan"],
+                       checkpoint["statuses"], checkpoint.get("dry_run", False))
+        progress.state = checkpoint.get("state", "pending")
+        progress.total = checkpoint.get("total", 0)
+        progress.migrated = checkpoint["migrated"]
+        progress.failed = checkpoint["failed"]
+        progress.cursor = checkpoint["cursor"]
+        progress.attempted = checkpoint.get("attempted", 0)
+        progress.error = checkpoint.get("error")
+        progress.started_at = checkpoint.get("started_at")
+        progress.finished_at = checkpoint.get("finished_at")
+        return progress
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "from_plan": self.from_plan,
+            "to_plan": self.to_plan,
+            "statuses": self.statuses,
+            "dry_run": self.dry_run,
+            "state": self.state,
+            "total": self.total,
+            "cursor": self.cursor,
+            "migrated": self.migrated,
+            "failed": self.failed,
+            "attempted": self.attempted,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        processed = self.migrated + len(self.failed)
+        return {
+            "jobId": self.job_id,
+            "state": self.state,
+            "dryRun": self.dry_run,
+            "fromPlan": self.from_plan,
+            "toPlan": self.to_plan,
+            "statuses": self.statuses,
+            "total": self.total,
+            "migrated": self.migrated,
+            "failed": len(self.failed),
+            "remaining": max(self.total - processed, 0),
+            "elapsedSeconds": round(elapsed, 3),
+            "throughputPerSecond": round(self.attempted / elapsed, 3) if elapsed else 0.0,
+            "error": self.error,
+        }
+
+    def acquire(self) -> bool:
+        """
+        Take the job's lock so no other worker runs it at the same time.
+
+        Returns:
+            bool: True if the lock was taken.
+        """
+        os.makedirs(settings.MIGRATION_CHECKPOINT_DIR, exist_ok=True)
+        lock_file = open(_lock_path(self.job_id), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+# Keep references so running jobs are not garbage collected
+_migration_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _checkpoint_path(job_id: str) -> str:
+    return os.path.join(settings.MIGRATION_CHECKPOINT_DIR, f"{job_id}.json")
+
+
+def _lock_path(job_id: str) -> str:
+    return os.path.join(settings.MIGRATION_CHECKPOINT_DIR, f"{job_id}.lock")
+
+
+def _is_locked(job_id: str) -> bool:
+    try:
+        lock_file = open(_lock_path(job_id))
+    except FileNotFoundError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        return False
+
+
+def _load_checkpoint(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_checkpoint_path(job_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(progress: MigrationProgress):
+    os.makedirs(settings.MIGRATION_CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(progress.job_id)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(progress.to_checkpoint(), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _target_filter(query, progress: MigrationProgress):
+    query = query.filter(
+        Subscription.plan == progress.from_plan,
+        Subscription.subscription_status.in_(progress.statuses))
+    if progress.cursor is not None:
+        query = query.filter(Subscription.user_id > progress.cursor)
+    return query
+
+
+def _count_targets(progress: MigrationProgress) -> int:
+    db = SessionLocal()
+    try:
+        return _target_filter(db.query(Subscription), progress).count()
+    finally:
+        db.close()
+
+
+def _next_batch(progress: MigrationProgress, batch_size: int) -> List[Any]:
+    db = SessionLocal()
+    try:
+        query = db.query(Subscription.user_id, Subscription.subscription_id)
+        return _target_filter(query, progress).order_by(Subscription.user_id).limit(batch_size).all()
+    finally:
+        db.close()
+
+
+def _failed_batch(progress: MigrationProgress, user_ids: List[str]) -> List[Any]:
+    # Rows that no longer match the source plan and statuses are left out
+    db = SessionLocal()
+    try:
+        query = db.query(Subscription.user_id, Subscription.subscription_id).filter(
+            Subscription.plan == progress.from_plan,
+            Subscription.subscription_status.in_(progress.statuses),
+            Subscription.user_id.in_(user_ids))
+        return query.order_by(Subscription.user_id).all()
+    finally:
+        db.close()
+
+
+def _apply_batch(user_ids: List[str], to_plan: str):
+    if not user_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(Subscription).filter(Subscription.user_id.in_(user_ids)).update({
+            Subscription.plan: to_plan,
+            Subscription.monthly_character_limit: SUBSCRIPTION_PLANS[to_plan],
+            Subscription.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _migrate_one(subscription_id: str, variant_id: str, pacer: RequestPacer, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        for attempt in range(1, settings.MIGRATION_MAX_ATTEMPTS + 1):
+            await pacer.wait()
+            try:
+                await update_lemon_squeezy_subscription(subscription_id, variant_id)
+                return True
+            except HTTPException as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt == settings.MIGRATION_MAX_ATTEMPTS:
+                    logger.error("Failed to migrate subscription %s: %s", subscription_id, e.detail)
+                    return False
+                retry_after = (e.headers or {}).get("Retry-After")
+                pacer.pause(float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt)
+    return False
+
+
+async def _migrate_batch(progress: MigrationProgress, batch: List[Any], variant_id: str,
+                         pacer: RequestPacer, semaphore: asyncio.Semaphore) -> List[str]:
+    results = await asyncio.gather(*[
+        _migrate_one(row.subscription_id, variant_id, pacer, semaphore) for row in batch])
+
+    succeeded = [row.user_id for row, ok in zip(batch, results) if ok]
+    await run_in_threadpool(_apply_batch, succeeded, progress.to_plan)
+
+    progress.migrated += len(succeeded)
+    progress.attempted += len(batch)
+    return [row.user_id for row, ok in zip(batch, results) if not ok]
+
+
+async def run_plan_migration(progress: MigrationProgress):
+    """
+    Move every matching subscription to the target plan.
+
+    Users that failed in an earlier run of the same job are retried first;
+    those that no longer match the source plan and statuses are dropped from
+    the failed list. The remaining rows are then processed in user_id order,
+    one batch at a time. After each batch the local rows are updated together
+    and the checkpoint is saved, so a restarted job resends at most one batch.
+    The job's lock is held until the run ends.
+
+    Args:
+        progress (MigrationProgress): A job from create_plan_migration; updated in place.
+    """
+    variant_id = PRODUCT_VARIANT_ID_MAP[progress.to_plan]
+    pacer = RequestPacer(settings.MIGRATION_REQUESTS_PER_SECOND)
+    semaphore = asyncio.Semaphore(settings.MIGRATION_CONCURRENCY)
+    batch_size = settings.MIGRATION_BATCH_SIZE
+
+    progress.state = "running"
+    progress.started_at = time.time()
+    try:
+        remaining = await run_in_threadpool(_count_targets, progress)
+        progress.total = progress.migrated + len(progress.failed) + remaining
+        await run_in_threadpool(_save_checkpoint, progress)
+
+        if progress.dry_run:
+            progress.state = "completed"
+            return
+
+        retry = progress.failed
+        for start in range(0, len(retry), batch_size):
+            chunk = retry[start:start + batch_size]
+            batch = await run_in_threadpool(_failed_batch, progress, chunk)
+            still_failed = set(await _migrate_batch(progress, batch, variant_id, pacer, semaphore))
+            settled = set(chunk) - still_failed
+            progress.failed = [user_id for user_id in progress.failed if user_id not in settled]
+            await run_in_threadpool(_save_checkpoint, progress)
+
+        while True:
+            batch = await run_in_threadpool(_next_batch, progress, batch_size)
+            if not batch:
+                break
+
+            progress.failed.extend(await _migrate_batch(progress, batch, variant_id, pacer, semaphore))
+            progress.cursor = batch[-1].user_id
+            await run_in_threadpool(_save_checkpoint, progress)
+
+            logger.info("Plan migration %s: %d migrated, %d failed of %d",
+                        progress.job_id, progress.migrated, len(progress.failed), progress.total)
+
+        progress.state = "completed"
+    except asyncio.CancelledError:
+        progress.state = "interrupted"
+        logger.warning("Plan migration %s interrupted; post it again with the same job ID to resume", progress.job_id)
+        raise
+    except Exception as e:
+        progress.state = "failed"
+        progress.error = str(e)
+        logger.error("Plan migration %s failed: %s", progress.job_id, e)
+    finally:
+        progress.finished_at = time.time()
+        try:
+            await run_in_threadpool(_save_checkpoint, progress)
+        except OSError as e:
+            logger.error("Could not save checkpoint for plan migration %s: %s", progress.job_id, e)
+        progress.release()
+
+
+def create_plan_migration(
+    from_plan: str,
+    to_plan: str,
+    statuses: List[str],
+    dry_run: bool,
+    job_id: Optional[str] = None
+) -> MigrationProgress:
+    """
+    Prepare a plan migration job, resuming from its checkpoint if one exists.
+
+    The returned job holds its lock; pass it to start_plan_migration.
+
+    Args:
+        from_plan (str): The plan subscriptions are currently on.
+        to_plan (str): The plan to move them to.
+        statuses (List[str]): Only subscriptions in these statuses are migrated.
+        dry_run (bool): Count the targets without calling the provider or updating rows.
+        job_id (str, optional): The ID of a job to resume.
+
+    Returns:
+        MigrationProgress: The job, ready to pass to run_plan_migration.
+
+    Raises:
+        HTTPException: If the plans or job ID are invalid, the job is already
+            running in any worker, or the checkpoint was written for different
+            parameters.
+    """
+    if to_plan not in PRODUCT_VARIANT_ID_MAP or to_plan not in SUBSCRIPTION_PLANS:
+        raise HTTPException(status_code=400, detail="Invalid target plan")
+    if from_plan == to_plan:
+        raise HTTPException(status_code=400, detail="Source and target plan are the same")
+    if job_id is not None and not JOB_ID_PATTERN.match(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID")
+
+    job_id = job_id or uuid.uuid4().hex
+    progress = MigrationProgress(job_id, from_plan, to_plan, statuses, dry_run)
+    if not progress.acquire():
+        raise HTTPException(status_code=409, detail="Migration is already running")
+
+    checkpoint = _load_checkpoint(job_id)
+    if checkpoint:
+        if (checkpoint["from_plan"], checkpoint["to_plan"], checkpoint["statuses"]) != (from_plan, to_plan, statuses):
+            progress.release()
+            raise HTTPException(status_code=409, detail="Checkpoint exists with different parameters")
+        progress.cursor = checkpoint["cursor"]
+        progress.migrated = checkpoint["migrated"]
+        progress.failed = checkpoint["failed"]
+
+    return progress
+
+
+def start_plan_migration(progress: MigrationProgress):
+    """
+    Run a prepared plan migration job in the background.
+
+    Args:
+        progress (MigrationProgress): The job returned by create_plan_migration.
+    """
+    task = asyncio.create_task(run_plan_migration(progress))
+    _migration_tasks[progress.job_id] = task
+    task.add_done_callback(lambda _: _migration_tasks.pop(progress.job_id, None))
+
+
+async def stop_plan_migrations():
+    """
+    Cancel the migration jobs running in this worker and wait for them to save
+    their checkpoints as interrupted.
+
+    Must run before the shared Lemon Squeezy client is closed.
+    """
+    tasks = list(_migration_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_plan_migration(job_id: str) -> Optional[MigrationProgress]:
+    """
+    Read a job's progress from its checkpoint.
+
+    A job left "running" whose lock no other worker holds is reported as
+    "interrupted"; post it again with the same job ID to resume it.
+
+    Args:
+        job_id (str): The ID of the job.
+
+    Returns:
+        Optional[MigrationProgress]: The job's progress, or None if it does not exist.
+    """
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    checkpoint = _load_checkpoint(job_id)
+    if checkpoint is None:
+        return None
+
+    progress = MigrationProgress.from_checkpoint(checkpoint)
+    if progress.state == "running" and not _is_locked(job_id):
+        progress.state = "interrupted"
+    return progress
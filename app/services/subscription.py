@@ -1,8 +1,10 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+from app.core.profiling import span
 from app.db.database import get_db
 from app.models.subscription import Subscription
+from app.services.entitlements import Entitlement, entitlement_snapshot
 from app.services.lemon_squeezy import (
     create_checkout_session,
     update_lemon_squeezy_subscription,
@@ -12,8 +14,6 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -29,10 +29,11 @@ async def get_existing_subscription(db: Session, user_id: str) -> Optional[Subsc
         Optional[Subscription]: The user's subscription if it exists, None otherwise.
     """
     try:
-        return db.query(Subscription).filter(Subscription.user_id == user_id).first()
+        with span("db.get_subscription"):
+            return db.query(Subscription).filter(Subscription.user_id == user_id).first()
     except SQLAlchemyError as e:
         logger.error(
-            f"Database error while fetching subscription for user {user_id}: {str(e)}")
+            "Database error while fetching subscription for user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -73,7 +74,7 @@ async def create_subscription(user_id: str, plan_id: str) -> Dict[str, Any]:
         raise
     except Exception as e:
         logger.error(
-            f"Error creating subscription for user {user_id}: {str(e)}")
+            "Error creating subscription for user %s: %s", user_id, e)
         raise HTTPException(
             status_code=500, detail="Failed to create subscription")
 
@@ -117,11 +118,54 @@ async def get_subscription(user_id: str) -> Dict[str, Any]:
             }
     except Exception as e:
         logger.error(
-            f"Error fetching subscription for user {user_id}: {str(e)}")
+            "Error fetching subscription for user %s: %s", user_id, e)
         raise HTTPException(
             status_code=500, detail="Failed to fetch subscription details")
 
 
+async def get_entitlement(user_id: str) -> Dict[str, Any]:
+    """
+    Get the plan and character limit a user is entitled to.
+
+    Reads the shared entitlement snapshot, falling back to the database when
+    the snapshot is not available.
+
+    Args:
+        user_id (str): The ID of the user.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the user's entitlement.
+    """
+    try:
+        entitlement = entitlement_snapshot.get(user_id)
+    except LookupError:
+        db = next(get_db())
+        try:
+            subscription = await get_existing_subscription(db, user_id)
+        finally:
+            db.close()
+        entitlement = subscription and Entitlement(
+            plan=subscription.plan,
+            status=subscription.subscription_status,
+            monthly_character_limit=subscription.monthly_character_limit,
+            renews_at=subscription.renews_at
+        )
+
+    if entitlement and entitlement.status == "active":
+        return {
+            "plan": entitlement.plan,
+            "status": entitlement.status,
+            "monthlyCharacterLimit": entitlement.monthly_character_limit,
+            "renewsAt": entitlement.renews_at
+        }
+    return {
+        "plan": "free",
+        "status": "free",
+        "monthlyCharacterLimit": 10000,
+        "renewsAt": None
+    }
+
+
 async def update_subscription(user_id: str, variant_id: str) -> Dict[str, Any]:
     """
     Update an existing subscription.
@@ -147,7 +191,7 @@ async def update_subscription(user_id: str, variant_id: str) -> Dict[str, Any]:
         # subscription.subscription_status = result["data"]["attributes"]["status"]
         # subscription.monthly_character_limit = 1000000
         # subscription.renews_at = result["data"]["attributes"]["renews_at"]
-        # subscription.updated_at = datetime.now()
+        # subscription.updated_at = datetime.utcnow()
         # db.commit()
 
         return result["data"]
@@ -155,7 +199,7 @@ async def update_subscription(user_id: str, variant_id: str) -> Dict[str, Any]:
         raise
     except Exception as e:
         logger.error(
-            f"Error updating subscription for user {user_id}: {str(e)}")
+            "Error updating subscription for user %s: %s", user_id, e)
         raise HTTPException(
             status_code=500, detail="Failed to update subscription")
 
@@ -180,15 +224,16 @@ async def cancel_subscription(user_id: str) -> Dict[str, bool]:
         await cancel_lemon_squeezy_subscription(subscription.subscription_id)
 
         subscription.subscription_status = "canceled"
-        subscription.updated_at = datetime.now()
-        db.commit()
+        subscription.updated_at = datetime.utcnow()
+        with span("db.commit"):
+            db.commit()
 
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(
-            f"Error canceling subscription for user {user_id}: {str(e)}")
+            "Error canceling subscription for user %s: %s", user_id, e)
         raise HTTPException(
             status_code=500, detail="Failed to cancel subscription")
 
@@ -217,14 +262,15 @@ async def resume_subscription(user_id: str, plan_id: str) -> Dict[str, Any]:
         subscription.subscription_status = result["data"]["attributes"]["status"]
         subscription.monthly_character_limit = 1000000
         subscription.renews_at = result["data"]["attributes"]["renews_at"]
-        subscription.updated_at = datetime.now()
-        db.commit()
+        subscription.updated_at = datetime.utcnow()
+        with span("db.commit"):
+            db.commit()
 
         return result["data"]
     except HTTPException:
         raise
     except Exception as e:
         logger.error(
-            f"Error resuming subscription for user {user_id}: {str(e)}")
+            "Error resuming subscription for user %s: %s", user_id, e)
         raise HTTPException(
             status_code=500, detail="Failed to resume subscription")
@@ -4,11 +4,9 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.models.subscription import Subscription
-from typing import Optional
+from typing import Iterable, Optional
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define subscription plans and their character limits
@@ -20,13 +18,13 @@ SUBSCRIPTION_PLANS = {
 }
 
 
-async def verify_webhook_signature(signature: str, payload: str, secret: str) -> bool:
+async def verify_webhook_signature(signature: str, payload: bytes, secret: str) -> bool:
     """
     Verify the webhook signature using HMAC-SHA256.
 
     Args:
         signature (str): The provided signature from the webhook header.
-        payload (str): The raw payload of the webhook.
+        payload (bytes): The raw payload of the webhook.
         secret (str): The webhook secret used for signature verification.
 
     Returns:
@@ -35,12 +33,12 @@ async def verify_webhook_signature(signature: str, payload: str, secret: str) ->
     try:
         computed_signature = hmac.new(
             secret.encode(),
-            payload.encode(),
+            payload,
             hashlib.sha256
         ).hexdigest()
         return hmac.compare_digest(signature, computed_signature)
     except Exception as e:
-        logger.error(f"Error verifying webhook signature: {str(e)}")
+        logger.error("Error verifying webhook signature: %s", e)
         return False
 
 
@@ -72,7 +70,7 @@ async def update_user_subscription(
         ValueError: If an invalid plan is provided.
     """
     if plan not in SUBSCRIPTION_PLANS:
-        logger.error(f"Invalid subscription plan: {plan}")
+        logger.error("Invalid subscription plan: %s", plan)
         raise ValueError(f"Invalid subscription plan: {plan}")
 
     now = datetime.utcnow()
@@ -90,7 +88,7 @@ async def update_user_subscription(
             subscription.monthly_character_limit = monthly_character_limit
             subscription.renews_at = renews_at
             subscription.updated_at = now
-            logger.info(f"Updated subscription for user {user_id}")
+            logger.info("Updated subscription for user %s", user_id)
         else:
             # Create new subscription
             subscription = Subscription(
@@ -105,7 +103,7 @@ async def update_user_subscription(
                 updated_at=now
             )
             db.add(subscription)
-            logger.info(f"Created new subscription for user {user_id}")
+            logger.info("Created new subscription for user %s", user_id)
 
         db.commit()
         return subscription
@@ -113,11 +111,53 @@ async def update_user_subscription(
     except SQLAlchemyError as e:
         db.rollback()
         logger.error(
-            f"Database error while updating subscription for user {user_id}: {str(e)}")
+            "Database error while updating subscription for user %s: %s", user_id, e)
         return None
 
     except Exception as e:
         db.rollback()
         logger.error(
-            f"Unexpected error while updating subscription for user {user_id}: {str(e)}")
+            "Unexpected error while updating subscription for user %s: %s", user_id, e)
+        return None
+
+
+async def update_subscription_status(
+    db: Session,
+    subscription_id: str,
+    status: str,
+    only_if: Optional[Iterable[str]] = None
+) -> Optional[Subscription]:
+    """
+    Set the status of an existing subscription identified by its Lemon Squeezy ID.
+
+    Args:
+        db (Session): The database session.
+        subscription_id (str): The Lemon Squeezy subscription ID.
+        status (str): The new subscription status.
+        only_if (Iterable[str], optional): Only update when the current status is one of these.
+
+    Returns:
+        Optional[Subscription]: The Subscription object, or None if it was not found or an error occurred.
+    """
+    try:
+        subscription = db.query(Subscription).filter(
+            Subscription.subscription_id == subscription_id).first()
+
+        if not subscription:
+            logger.warning("No subscription found for Lemon Squeezy subscription %s", subscription_id)
+            return None
+
+        if only_if is not None and subscription.subscription_status not in only_if:
+            return subscription
+
+        subscription.subscription_status = status
+        subscription.updated_at = datetime.utcnow()
+        db.commit()
+        logger.info("Set subscription %s status to %s", subscription_id, status)
+        return subscription
+
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(
+            "Database error while updating status of subscription %s: %s", subscription_id, e)
         return None
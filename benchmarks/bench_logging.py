@@ -0,0 +1,104 @@
+"""
+Measure per-request logging overhead on the calling thread.
+
+Compares the old setup (basicConfig-style synchronous StreamHandler with
+eager f-string messages) against the queue-based pipeline from
+app.core.logging_config, with and without sampling. Each is run against a
+fast stream (a temporary file) and a slow one whose writes block for
+SLOW_WRITE_SECONDS, standing in for a stdout pipe that is not drained.
+
+Usage:
+    python -m benchmarks.bench_logging [iterations]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+SLOW_WRITE_SECONDS = 0.0002
+
+os.environ.setdefault("LEMON_SQUEEZY_API_KEY", "bench")
+os.environ.setdefault("FIREBASE_PROJECT_ID", "bench")
+os.environ.setdefault("LEMON_SQUEEZY_WEBHOOK_SECRET", "bench")
+
+from app.core.logging_config import ContextQueueHandler, JsonFormatter, SamplingFilter  # noqa: E402
+
+from logging.handlers import QueueListener  # noqa: E402
+import queue  # noqa: E402
+
+
+class SlowStream:
+    """
+    Stream whose writes block, like a full pipe to a log collector.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str):
+        time.sleep(SLOW_WRITE_SECONDS)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_sync(logger: logging.Logger, stream, iterations: int) -> float:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    logger.handlers = [handler]
+
+    def log(i):
+        user = f"user-{i}"
+        logger.info(f"Successfully processed subscription_updated event for user {user}")
+
+    return _per_call_us(log, iterations)
+
+
+def bench_queue(logger: logging.Logger, stream, iterations: int, sample_rate: float) -> float:
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    logger.handlers = [queue_handler]
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+
+    def log(i):
+        logger.info("Successfully processed %s event for user %s",
+                    "subscription_updated", f"user-{i}", extra={"sample": True})
+
+    try:
+        return _per_call_us(log, iterations)
+    finally:
+        listener.stop()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    results = {}
+    with tempfile.TemporaryFile("w") as stream:
+        for label, target in (("fast stream", stream), ("slow stream", SlowStream(stream))):
+            results[f"sync handler, f-string, {label}"] = bench_sync(logger, target, iterations)
+            results[f"queue handler, lazy, {label}"] = bench_queue(logger, target, iterations, 1.0)
+            results[f"queue handler, lazy, 10% sampled, {label}"] = bench_queue(logger, target, iterations, 0.1)
+
+    for name, per_call in results.items():
+        print(f"{name:<50} {per_call:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
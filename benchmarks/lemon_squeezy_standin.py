@@ -0,0 +1,64 @@
+"""
+Local stand-in for the Lemon Squeezy subscriptions API.
+
+Accepts subscription updates with a configurable latency and rate limit, so
+plan migrations can be exercised and timed without touching the real API.
+
+Usage:
+    STANDIN_LATENCY_MS=80 STANDIN_REQUESTS_PER_SECOND=20 \\
+        uvicorn benchmarks.lemon_squeezy_standin:app --port 9000
+    LEMON_SQUEEZY_API_URL=http://localhost:9000/v1 uvicorn app.main:app
+"""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_SECONDS = float(os.environ.get("STANDIN_LATENCY_MS", "50")) / 1000
+REQUESTS_PER_SECOND = float(os.environ.get("STANDIN_REQUESTS_PER_SECOND", "10"))
+
+app = FastAPI(title="Lemon Squeezy stand-in")
+
+_window_started = time.monotonic()
+_window_count = 0
+updates = {}
+
+
+def _rate_limited() -> bool:
+    global _window_started, _window_count
+    now = time.monotonic()
+    if now - _window_started >= 1:
+        _window_started, _window_count = now, 0
+    _window_count += 1
+    return _window_count > REQUESTS_PER_SECOND
+
+
+@app.head("/v1")
+async def root():
+    return {}
+
+
+@app.patch("/v1/subscriptions/{subscription_id}")
+async def update_subscription(subscription_id: str, request: Request):
+    if _rate_limited():
+        return JSONResponse(status_code=429, content={"errors": [{"detail": "Too Many Requests"}]},
+                            headers={"Retry-After": "1"})
+
+    await asyncio.sleep(LATENCY_SECONDS)
+    body = await request.json()
+    variant_id = body["data"]["attributes"]["variant_id"]
+    updates[subscription_id] = variant_id
+    return {
+        "data": {
+            "type": "subscriptions",
+            "id": subscription_id,
+            "attributes": {"variant_id": variant_id, "status": "active"}
+        }
+    }
+
+
+@app.get("/v1/standin/updates")
+async def get_updates():
+    return {"count": len(updates), "updates": updates}